@@ -16,18 +16,23 @@ will create benchmark.yaml as well as copy the files from OSS-Fuzz to build the
 benchmark."""
 import argparse
 import bisect
+import collections
+import contextlib
 import datetime
-from distutils import spawn
-from distutils import dir_util
+import fcntl
+import functools
 import json
+from multiprocessing import pool as mp_pool
 import os
-import sys
-import subprocess
+import re
+import shutil
 import tempfile
+import time
 
+import numpy as np
 
-from common import utils
 from common import benchmark_utils
+from common import filesystem
 from common import logs
 from common import new_process
 from common import yaml_utils
@@ -35,6 +40,33 @@ from common import yaml_utils
 OSS_FUZZ_REPO_URL = 'https://github.com/google/oss-fuzz'
 OSS_FUZZ_IMAGE_UPGRADE_DATE = datetime.datetime(
     year=2021, month=8, day=25, tzinfo=datetime.timezone.utc)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'fuzzbench')
+# Bare clone of OSS-Fuzz that is kept between invocations so that OSS-Fuzz only
+# needs to be cloned once.
+OSS_FUZZ_CACHE_DIR = os.path.join(CACHE_DIR, 'oss-fuzz')
+# Don't fetch OSS-Fuzz again if it was fetched this recently, so that
+# integrating many benchmarks at once only fetches once.
+OSS_FUZZ_CACHE_FETCH_INTERVAL_SECONDS = 60
+# File whose modification time is when OSS-Fuzz was last cloned or fetched. A
+# clone doesn't write FETCH_HEAD, so that can't be used.
+OSS_FUZZ_CACHE_FETCH_TIME_FILE = os.path.join(OSS_FUZZ_CACHE_DIR,
+                                              'fuzzbench-last-fetch')
+# Index of which OSS-Fuzz commits changed each project.
+OSS_FUZZ_HISTORY_FILE = os.path.join(CACHE_DIR, 'oss-fuzz-history.json')
+# Versioned because older caches stored tag timestamps with UTC offsets, which
+# numpy only parses with a deprecation warning.
+BASE_BUILDER_TAGS_CACHE_FILE = os.path.join(CACHE_DIR,
+                                            'base-builder-tags-v2.json')
+BASE_BUILDER_TAGS_CACHE_TTL_SECONDS = 60 * 60
+NUM_COPY_THREADS = 8
+MAX_CONCURRENT_INTEGRATIONS = 16
+BASE_BUILDER_REGEX = re.compile(
+    r'^FROM\s+(gcr\.dockerproxy\.com/oss-fuzz-base/base-builder\S*)',
+    re.MULTILINE)
+# Digest of the base-builder image used unless the image is looked up based on
+# the commit date. See https://github.com/google/oss-fuzz/issues/8625.
+PINNED_BASE_BUILDER_DIGEST = ('sha256:fb1a9a49752c9e504687448d1f1a048ec1e0'
+                              '62e2e40f7e8a23e86b63ff3dad7c')
 
 
 class GitRepoManager:
@@ -42,57 +74,267 @@ class GitRepoManager:
 
     def __init__(self, repo_dir):
         self.repo_dir = repo_dir
+        # Fail instead of waiting for credentials that will never be entered.
+        self.env = os.environ.copy()
+        self.env['GIT_TERMINAL_PROMPT'] = '0'
 
-    def git(self, cmd):
+    def git(self, cmd, env=None, expect_zero=True):
         """Runs a git command.
 
         Args:
           cmd: The git command as a list to be run.
+          env: Environment variables to set for the command only.
+          expect_zero: Raise an exception if the command fails.
 
         Returns:
           new_process.ProcessResult
         """
-        return new_process.execute(['git'] + cmd, cwd=self.repo_dir)
-
-
-class BaseBuilderDockerRepo:
-    """Repo of base-builder images."""
-
-    def __init__(self):
-        self.timestamps = []
-        self.digests = []
-
-    def add_digest(self, timestamp, digest):
-        """Add a digest."""
-        self.timestamps.append(timestamp)
-        self.digests.append(digest)
+        process_env = self.env.copy()
+        if env:
+            process_env.update(env)
+        return new_process.execute(['git', '-C', self.repo_dir] + cmd,
+                                   env=process_env,
+                                   expect_zero=expect_zero)
+
+
+class BaseBuilderDockerRepo(
+        collections.namedtuple('BaseBuilderDockerRepo',
+                               ['timestamps', 'digests'])):
+    """Repo of base-builder images. |timestamps| is a read-only numpy array of
+    UTC times sorted in ascending order and |digests| is a tuple of the
+    corresponding digests, so that the repo can be shared between
+    integrations."""
 
     def find_digest(self, timestamp):
         """Finds the latest image before the given timestamp."""
-        index = bisect.bisect_right(self.timestamps, timestamp)
+        timestamp = np.datetime64(_to_naive_utc(timestamp), 'us')
+        index = np.searchsorted(self.timestamps, timestamp, side='right')
         if index > 0:
             return self.digests[index - 1]
         raise ValueError('Failed to find suitable base-builder.')
 
 
+def _to_naive_utc(timestamp):
+    """Returns |timestamp| converted to UTC without tzinfo, which is what numpy
+    expects."""
+    return timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _read_cache_file(path):
+    """Returns the JSON contents of the cache file at |path|. Returns None if it
+    doesn't exist or is corrupt."""
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_cache_file(path, contents):
+    """Writes |contents| as JSON to the cache file at |path|."""
+    cache_dir = os.path.dirname(path)
+    filesystem.create_directory(cache_dir)
+    # Write to a temporary file first so that concurrent readers never see a
+    # partially written cache.
+    with tempfile.NamedTemporaryFile('w',
+                                     dir=cache_dir,
+                                     encoding='utf-8',
+                                     delete=False) as handle:
+        json.dump(contents, handle)
+    os.replace(handle.name, path)
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path):
+    """Holds an exclusive lock on the file at |lock_path|. This serializes
+    concurrent integrations, both threads and processes."""
+    filesystem.create_directory(os.path.dirname(lock_path))
+    with open(lock_path, 'w', encoding='utf-8') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _oss_fuzz_cache_lock():
+    """Returns a lock on the OSS-Fuzz cache so that concurrent integrations
+    don't clone or fetch into it at the same time."""
+    return _file_lock(OSS_FUZZ_CACHE_DIR + '.lock')
+
+
+def _get_cached_oss_fuzz_repo():
+    """Clones OSS-Fuzz into |OSS_FUZZ_CACHE_DIR| if it hasn't been cloned yet,
+    otherwise fetches new commits if it wasn't fetched recently. Returns a
+    GitRepoManager for the clone."""
+    oss_fuzz_repo_manager = GitRepoManager(OSS_FUZZ_CACHE_DIR)
+    with _oss_fuzz_cache_lock():
+        # File contents are not fetched up front, only the files of the
+        # projects that are checked out are downloaded.
+        if not os.path.exists(OSS_FUZZ_CACHE_DIR):
+            clone_command = ['clone', '--bare', '--filter=blob:none']
+            oss_fuzz_mirror = os.getenv('FUZZBENCH_OSS_FUZZ_MIRROR')
+            if oss_fuzz_mirror:
+                # Copy what is already in the mirror (e.g. from the
+                # oss-fuzz-mirror image) instead of downloading it.
+                clone_command += [
+                    '--reference-if-able', oss_fuzz_mirror, '--dissociate'
+                ]
+            GitRepoManager(os.path.dirname(OSS_FUZZ_CACHE_DIR)).git(
+                clone_command + [OSS_FUZZ_REPO_URL, OSS_FUZZ_CACHE_DIR])
+            filesystem.write(OSS_FUZZ_CACHE_FETCH_TIME_FILE, '')
+        elif (_get_seconds_since_oss_fuzz_fetch() >
+              OSS_FUZZ_CACHE_FETCH_INTERVAL_SECONDS):
+            oss_fuzz_repo_manager.git([
+                'fetch', '--filter=blob:none', 'origin',
+                '+refs/heads/*:refs/heads/*'
+            ])
+            filesystem.write(OSS_FUZZ_CACHE_FETCH_TIME_FILE, '')
+    return oss_fuzz_repo_manager
+
+
+def _get_seconds_since_oss_fuzz_fetch():
+    """Returns the number of seconds since OSS-Fuzz was last fetched into the
+    cache. Returns infinity if it was never fetched."""
+    if not os.path.exists(OSS_FUZZ_CACHE_FETCH_TIME_FILE):
+        return float('inf')
+    return time.time() - os.path.getmtime(OSS_FUZZ_CACHE_FETCH_TIME_FILE)
+
+
+def _parallel_copytree(src_dir, dst_dir, num_threads=NUM_COPY_THREADS):
+    """Copies the contents of |src_dir| into |dst_dir|, keeping anything
+    already in |dst_dir| that isn't overwritten. Symlinks are copied as
+    symlinks. Files are copied concurrently since copying many small files is
+    dominated by syscall latency."""
+    file_copies = []
+    for root, dirnames, filenames in os.walk(src_dir):
+        dst_root = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        filesystem.create_directory(dst_root)
+        # os.walk doesn't descend into symlinks to directories, so copy them
+        # along with the files.
+        for name in dirnames + filenames:
+            src_path = os.path.join(root, name)
+            dst_path = os.path.join(dst_root, name)
+            if os.path.islink(src_path):
+                if os.path.isdir(dst_path) and not os.path.islink(dst_path):
+                    shutil.rmtree(dst_path)
+                elif os.path.lexists(dst_path):
+                    os.remove(dst_path)
+                os.symlink(os.readlink(src_path), dst_path)
+            elif name in filenames:
+                file_copies.append((src_path, dst_path))
+
+    with mp_pool.ThreadPool(num_threads) as pool:
+        pool.starmap(shutil.copy2, file_copies)
+
+
+def _parse_oss_fuzz_log(log_output, history):
+    """Adds the commits in |log_output|, the output of git log --name-only
+    --format='%x00%H %ct' in chronological order, to |history|, a dict mapping
+    each project to a list of [commit timestamp, commit] pairs. Lines that are
+    neither commits nor files in projects/, such as git warnings, are
+    ignored."""
+    commit = timestamp = None
+    # Filenames may contain characters that str.splitlines splits on.
+    for line in log_output.split('\n'):
+        if line.startswith('\0'):
+            commit, timestamp = line[1:].split()
+            timestamp = int(timestamp)
+            continue
+        # Git quotes paths with unusual characters.
+        path = line[1:] if line.startswith('"') else line
+        if not path.startswith('projects/') or commit is None:
+            continue
+        entries = history.setdefault(path.split('/')[1], [])
+        # Only add each commit once even if it changed many files.
+        if not entries or entries[-1][1] != commit:
+            entries.append([timestamp, commit])
+
+
+@functools.lru_cache(maxsize=1)
+def _get_oss_fuzz_history(head):
+    """Returns a dict mapping each OSS-Fuzz project to a list of
+    [commit timestamp, commit] pairs of the commits up to |head| that changed
+    it, sorted by timestamp. The index is kept in |OSS_FUZZ_HISTORY_FILE| and
+    only commits added since it was written are read from git."""
+    oss_fuzz_repo_manager = GitRepoManager(OSS_FUZZ_CACHE_DIR)
+    cache = _read_cache_file(OSS_FUZZ_HISTORY_FILE)
+    if cache and cache['head'] == head:
+        return cache['history']
+
+    revision_range = head
+    history = {}
+    if cache:
+        is_ancestor = oss_fuzz_repo_manager.git(
+            ['merge-base', '--is-ancestor', cache['head'], head],
+            expect_zero=False).retcode == 0
+        if is_ancestor:
+            revision_range = cache['head'] + '..' + head
+            history = cache['history']
+
+    # Rename detection would fetch the contents of renamed files, which aren't
+    # in the partial clone. It would also hide that the old project changed.
+    # Commit lines start with a NUL so that they can't be confused with paths.
+    # Don't quote non-ASCII paths.
+    _, log_output, _ = oss_fuzz_repo_manager.git([
+        '-c', 'core.quotePath=false', 'log', '--reverse', '--no-renames',
+        '--format=%x00%H %ct', '--name-only', revision_range, '--', 'projects'
+    ])
+    _parse_oss_fuzz_log(log_output, history)
+    # Commit timestamps aren't necessarily in the same order as the history.
+    for entries in history.values():
+        entries.sort(key=lambda entry: entry[0])
+    _write_cache_file(OSS_FUZZ_HISTORY_FILE, {'head': head, 'history': history})
+    return history
+
+
+def _find_oss_fuzz_commit(oss_fuzz_repo_manager, project, commit_date):
+    """Returns the last OSS-Fuzz commit before |commit_date| that changed
+    |project|. Returns None if there is no such commit."""
+    _, head, _ = oss_fuzz_repo_manager.git(['rev-parse', 'HEAD'])
+    with _oss_fuzz_cache_lock():
+        history = _get_oss_fuzz_history(head.strip())
+    entries = history.get(project, [])
+    index = bisect.bisect_right(entries,
+                                commit_date.timestamp(),
+                                key=lambda entry: entry[0])
+    if index == 0:
+        return None
+    return entries[index - 1][1]
+
+
 def copy_oss_fuzz_files(project, commit_date, benchmark_dir):
     """Checks out the right files from OSS-Fuzz to build the benchmark based on
     |project| and |commit_date|. Then copies them to |benchmark_dir|."""
-    with tempfile.TemporaryDirectory() as oss_fuzz_dir:
-        oss_fuzz_repo_manager = GitRepoManager(oss_fuzz_dir)
-        oss_fuzz_repo_manager.git(['clone', OSS_FUZZ_REPO_URL, oss_fuzz_dir])
-        project_dir = os.path.join(oss_fuzz_dir, 'projects', project)
-        # Find an OSS-Fuzz commit that can be used to build the benchmark.
-        _, oss_fuzz_commit, _ = oss_fuzz_repo_manager.git([
-            'log', '--before=' + commit_date.isoformat(), '-n1', '--format=%H',
-            project_dir
-        ])
-        oss_fuzz_commit = oss_fuzz_commit.strip()
-        if not oss_fuzz_commit:
-            logs.warning('No suitable earlier OSS-Fuzz commit found.')
-            return False
-        oss_fuzz_repo_manager.git(['checkout', oss_fuzz_commit, project_dir])
-        dir_util.copy_tree(project_dir, benchmark_dir)
+    oss_fuzz_repo_manager = _get_cached_oss_fuzz_repo()
+    project_path = os.path.join('projects', project)
+    # Find an OSS-Fuzz commit that can be used to build the benchmark.
+    oss_fuzz_commit = _find_oss_fuzz_commit(oss_fuzz_repo_manager, project,
+                                            commit_date)
+    if not oss_fuzz_commit:
+        logs.warning('No suitable earlier OSS-Fuzz commit found.')
+        return False
+    # Create the work tree on the same filesystem as |benchmark_dir| so that the
+    # project can be moved there without copying.
+    benchmark_parent_dir = os.path.dirname(os.path.abspath(benchmark_dir))
+    filesystem.create_directory(benchmark_parent_dir)
+    with tempfile.TemporaryDirectory(dir=benchmark_parent_dir,
+                                     prefix='.oss-fuzz-') as oss_fuzz_dir:
+        # Use a temporary work tree and index so that the cached clone is
+        # never modified by checkouts and concurrent checkouts don't conflict.
+        oss_fuzz_repo_manager.git(
+            [
+                '--work-tree=' + oss_fuzz_dir, 'restore',
+                '--source=' + oss_fuzz_commit, '--worktree', '--', project_path
+            ],
+            env={'GIT_INDEX_FILE': os.path.join(oss_fuzz_dir, '.git-index')})
+        project_dir = os.path.join(oss_fuzz_dir, project_path)
+        if os.path.exists(benchmark_dir):
+            _parallel_copytree(project_dir, benchmark_dir)
+        else:
+            # The work tree is deleted afterwards anyway, so just move the
+            # project (a rename when on the same filesystem).
+            shutil.move(project_dir, benchmark_dir)
         os.remove(os.path.join(benchmark_dir, 'project.yaml'))
         return True
 
@@ -104,76 +346,116 @@ def get_benchmark_name(project, fuzz_target, benchmark_name=None):
     return name.lower()
 
 
-def _load_docker_repo(docker_image):
-    """Gets base-image digests. Returns the docker repo."""
-    gcloud_path = spawn.find_executable('gcloud')
-    if not gcloud_path:
-        logs.warning('gcloud not found in PATH.')
+def _read_cached_docker_tags(docker_image):
+    """Returns the (timestamp, digest) pairs of |docker_image| cached on disk.
+    Returns None if they aren't cached or the cache has expired."""
+    cache = _read_cache_file(BASE_BUILDER_TAGS_CACHE_FILE) or {}
+    entry = cache.get(docker_image)
+    if (entry is None or
+            time.time() - entry['time'] > BASE_BUILDER_TAGS_CACHE_TTL_SECONDS):
         return None
-
-    _, result, _ = new_process.execute([
-        gcloud_path,
-        'container',
-        'images',
-        'list-tags',
-        docker_image,
-        '--format=json',
-        '--sort-by=timestamp',
-    ])
-    result = json.loads(result)
-
-    repo = BaseBuilderDockerRepo()
-    for image in result:
-        timestamp = datetime.datetime.fromisoformat(
-            image['timestamp']['datetime']).astimezone(datetime.timezone.utc)
-        repo.add_digest(timestamp, image['digest'])
-
-    return repo
-
-
-def _get_base_builder(dockerfile_path):
-    with open(dockerfile_path) as handle:
-        lines = handle.readlines()
-    for line in lines:
-        line = line.strip()
-        if line.startswith('FROM gcr.dockerproxy.com/oss-fuzz-base/base-builder'):
-            return line[len('FROM '):]
-
-    raise ValueError('Could not find base-builder')
-
-def _replace_base_builder_digest(dockerfile_path, base_builder_name, digest):
-    """Replaces the base-builder digest in a Dockerfile."""
-    with open(dockerfile_path) as handle:
-        lines = handle.readlines()
-
-    new_lines = []
-    for line in lines:
-        if line.strip().startswith('FROM'):
-            line = f'FROM {base_builder_name}@{digest}\n'
-
-        new_lines.append(line)
-
-    with open(dockerfile_path, 'w') as handle:
-        handle.write(''.join(new_lines))
+    return entry['tags']
+
+
+def _write_cached_docker_tags(docker_image, tags):
+    """Caches the (timestamp, digest) pairs |tags| of |docker_image| on
+    disk."""
+    cache = _read_cache_file(BASE_BUILDER_TAGS_CACHE_FILE) or {}
+    cache[docker_image] = {'time': time.time(), 'tags': tags}
+    _write_cache_file(BASE_BUILDER_TAGS_CACHE_FILE, cache)
+
+
+def _get_docker_tags(docker_image):
+    """Returns the (timestamp, digest) pairs of |docker_image|, from the cache
+    on disk if possible. Returns None if gcloud isn't installed."""
+    # Hold the lock while listing tags so that concurrent integrations don't
+    # all run gcloud or overwrite each other's cache entries.
+    with _file_lock(BASE_BUILDER_TAGS_CACHE_FILE + '.lock'):
+        tags = _read_cached_docker_tags(docker_image)
+        if tags is not None:
+            return tags
+
+        gcloud_path = shutil.which('gcloud')
+        if not gcloud_path:
+            logs.warning('gcloud not found in PATH.')
+            return None
+
+        _, result, _ = new_process.execute([
+            gcloud_path,
+            'container',
+            'images',
+            'list-tags',
+            docker_image,
+            # Output UTC timestamps without an offset since that is what numpy
+            # can parse.
+            ('--format=value(timestamp.datetime.date('
+             'format="%Y-%m-%dT%H:%M:%S",tz=UTC),digest)'),
+            '--sort-by=timestamp',
+        ])
+        tags = []
+        for line in result.splitlines():
+            fields = line.split('\t')
+            # Skip anything gcloud logged to stderr.
+            if len(fields) == 2:
+                tags.append(fields)
+        _write_cached_docker_tags(docker_image, tags)
+        return tags
 
 
-def replace_base_builder(benchmark_dir, commit_date):
+@functools.lru_cache(maxsize=None)
+def _load_docker_repo(docker_image):
+    """Gets base-image digests. Returns the docker repo."""
+    tags = _get_docker_tags(docker_image)
+    if tags is None:
+        return None
+    timestamps, digests = zip(*tags) if tags else ((), ())
+    timestamps = np.array(timestamps, dtype='datetime64[us]')
+    timestamps.flags.writeable = False
+    return BaseBuilderDockerRepo(timestamps, digests)
+
+
+def _get_base_builder(dockerfile):
+    """Returns the base-builder image that the contents of a Dockerfile,
+    |dockerfile|, is based on."""
+    match = BASE_BUILDER_REGEX.search(dockerfile)
+    if not match:
+        raise ValueError('Could not find base-builder')
+    return match.group(1)
+
+
+def _replace_base_builder_digest(dockerfile, digest):
+    """Returns the contents of a Dockerfile, |dockerfile|, with its base-builder
+    image pinned to |digest|."""
+    match = BASE_BUILDER_REGEX.search(dockerfile)
+    if not match:
+        raise ValueError('Could not find base-builder')
+    return (dockerfile[:match.end(1)] + f'@{digest}' +
+            dockerfile[match.end(1):])
+
+
+def replace_base_builder(benchmark_dir,
+                         commit_date,
+                         dynamic_base_builder=False):
     """Replaces the parent image of the Dockerfile in |benchmark_dir|,
-    base-builder (latest), with a version of base-builder that is likely to
-    build the project as it was on |commit_date| without issue."""
+    base-builder (latest), with |PINNED_BASE_BUILDER_DIGEST|. If
+    |dynamic_base_builder|, uses a version of base-builder that is likely to
+    build the project as it was on |commit_date| without issue instead."""
     dockerfile_path = os.path.join(benchmark_dir, 'Dockerfile')
-    base_builder_name = _get_base_builder(dockerfile_path)
-    base_builder_repo = _load_docker_repo(base_builder_name)
-    if base_builder_repo:
-        # base_builder_digest = base_builder_repo.find_digest(commit_date)
-        base_builder_digest = ('sha256:fb1a9a49752c9e504687448d1f1a048ec1e0'
-                               '62e2e40f7e8a23e86b63ff3dad7c')
+    dockerfile = filesystem.read(dockerfile_path)
+    base_builder_name = _get_base_builder(dockerfile)
+    if dynamic_base_builder:
+        base_builder_repo = _load_docker_repo(base_builder_name)
+        if not base_builder_repo:
+            return
+        base_builder_digest = base_builder_repo.find_digest(commit_date)
+    else:
+        base_builder_digest = PINNED_BASE_BUILDER_DIGEST
         print(f'Using image {base_builder_digest}. '
               'See https://github.com/google/oss-fuzz/issues/8625')
-        logs.info('Using base-builder with digest %s.', base_builder_digest)
-        _replace_base_builder_digest(
-            dockerfile_path, base_builder_name, base_builder_digest)
-
+    logs.info('Using base-builder with digest %s.', base_builder_digest)
+    filesystem.write(
+        dockerfile_path,
+        _replace_base_builder_digest(dockerfile, base_builder_digest))
 
 
 def create_oss_fuzz_yaml(project, fuzz_target, commit, commit_date,
@@ -190,10 +472,16 @@ def create_oss_fuzz_yaml(project, fuzz_target, commit, commit_date,
     yaml_utils.write(yaml_filename, config)
 
 
-def integrate_benchmark(project, fuzz_target, benchmark_name, commit,
-                        commit_date):
+def integrate_benchmark(project,
+                        fuzz_target,
+                        benchmark_name,
+                        commit,
+                        commit_date,
+                        dynamic_base_builder=False):
     """Copies files needed to integrate an OSS-Fuzz benchmark and creates the
-    benchmark's benchmark.yaml file."""
+    benchmark's benchmark.yaml file. See replace_base_builder for
+    |dynamic_base_builder|."""
+    # pylint: disable=too-many-arguments
     benchmark_name = get_benchmark_name(project, fuzz_target, benchmark_name)
     benchmark_dir = os.path.join(benchmark_utils.BENCHMARKS_DIR, benchmark_name)
     # TODO(metzman): Replace with dateutil since fromisoformat isn't supposed to
@@ -205,12 +493,26 @@ def integrate_benchmark(project, fuzz_target, benchmark_name, commit,
             f'Cannot integrate benchmark before {OSS_FUZZ_IMAGE_UPGRADE_DATE}. '
             'See https://github.com/google/fuzzbench/issues/1353')
     copy_oss_fuzz_files(project, commit_date, benchmark_dir)
-    replace_base_builder(benchmark_dir, commit_date)
+    replace_base_builder(benchmark_dir, commit_date, dynamic_base_builder)
     create_oss_fuzz_yaml(project, fuzz_target, commit, commit_date,
                          benchmark_dir)
     return benchmark_name
 
 
+def integrate_benchmarks(benchmark_specs):
+    """Integrates multiple OSS-Fuzz benchmarks concurrently. |benchmark_specs|
+    is a list of (project, fuzz_target, benchmark_name, commit, commit_date)
+    tuples, the arguments to integrate_benchmark, optionally followed by
+    dynamic_base_builder. Returns the names of the benchmarks."""
+    if not benchmark_specs:
+        return []
+    num_threads = min(MAX_CONCURRENT_INTEGRATIONS, len(benchmark_specs))
+    # Integration is mostly waiting on git and copying files, so threads are
+    # enough.
+    with mp_pool.ThreadPool(num_threads) as pool:
+        return pool.starmap(integrate_benchmark, benchmark_specs)
+
+
 def main():
     """Copies files needed to integrate an OSS-Fuzz benchmark and creates the
     benchmark's benchmark.yaml file."""
@@ -236,15 +538,21 @@ def main():
         '--date',
         help='Date of the commit. Example: 2019-10-19T09:07:25+01:00',
         required=True)
+    parser.add_argument(
+        '--dynamic-base-builder',
+        help=('Use the base-builder image from the date of the commit instead '
+              'of a pinned one. Requires gcloud.'),
+        action='store_true',
+        required=False)
 
     logs.initialize()
     args = parser.parse_args()
     if args.date is None and args.commit is None:
         args.date = str(datetime.datetime.utcnow())
         print('Neither date nor commit specified, using time now: ', args.date)
-    benchmark = integrate_benchmark(
-        args.project, args.fuzz_target, args.benchmark_name,
-        args.commit, args.date)
+    benchmark = integrate_benchmark(args.project, args.fuzz_target,
+                                    args.benchmark_name, args.commit, args.date,
+                                    args.dynamic_base_builder)
     logs.info('Successfully integrated benchmark: %s.', benchmark)
     logs.info('Please run "make test-run-afl-%s" to test integration.',
               benchmark)
@@ -0,0 +1,330 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for oss_fuzz_benchmark_integration.py."""
+import datetime
+import os
+import subprocess
+import time
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from benchmarks import oss_fuzz_benchmark_integration
+
+# pylint: disable=protected-access
+
+BASE_BUILDER = 'gcr.dockerproxy.com/oss-fuzz-base/base-builder'
+DIGEST = 'sha256:1234'
+DOCKERFILE = f'''# Comment.
+FROM {BASE_BUILDER}
+RUN apt-get update && apt-get install -y make
+COPY build.sh $SRC/
+'''
+
+
+def test_get_base_builder():
+    """Tests that _get_base_builder finds the base-builder image."""
+    assert oss_fuzz_benchmark_integration._get_base_builder(
+        DOCKERFILE) == BASE_BUILDER
+
+
+def test_get_base_builder_missing():
+    """Tests that _get_base_builder raises an exception when the Dockerfile
+    isn't based on base-builder."""
+    with pytest.raises(ValueError):
+        oss_fuzz_benchmark_integration._get_base_builder('FROM ubuntu:20.04\n')
+
+
+def test_replace_base_builder_digest():
+    """Tests that _replace_base_builder_digest only pins the parent image."""
+    dockerfile = oss_fuzz_benchmark_integration._replace_base_builder_digest(
+        DOCKERFILE, DIGEST)
+    assert dockerfile == DOCKERFILE.replace(f'FROM {BASE_BUILDER}\n',
+                                            f'FROM {BASE_BUILDER}@{DIGEST}\n')
+
+
+def test_replace_base_builder_digest_multi_stage():
+    """Tests that _replace_base_builder_digest pins base-builder rather than the
+    first parent image of a multi-stage Dockerfile."""
+    dockerfile = ('FROM ubuntu:20.04 AS tools\n'
+                  f'FROM {BASE_BUILDER} AS builder\n'
+                  'COPY --from=tools /usr/bin/make /usr/bin/make\n')
+    expected_dockerfile = dockerfile.replace(f'FROM {BASE_BUILDER} ',
+                                             f'FROM {BASE_BUILDER}@{DIGEST} ')
+    assert oss_fuzz_benchmark_integration._replace_base_builder_digest(
+        dockerfile, DIGEST) == expected_dockerfile
+
+
+def test_parallel_copytree_merge(tmp_path):
+    """Tests that _parallel_copytree merges into an existing directory."""
+    src_dir = tmp_path / 'src'
+    (src_dir / 'subdir').mkdir(parents=True)
+    (src_dir / 'file').write_text('new')
+    (src_dir / 'subdir' / 'nested').write_text('nested')
+    dst_dir = tmp_path / 'dst'
+    dst_dir.mkdir()
+    (dst_dir / 'file').write_text('old')
+    (dst_dir / 'kept').write_text('kept')
+
+    oss_fuzz_benchmark_integration._parallel_copytree(str(src_dir),
+                                                      str(dst_dir))
+    assert (dst_dir / 'file').read_text() == 'new'
+    assert (dst_dir / 'kept').read_text() == 'kept'
+    assert (dst_dir / 'subdir' / 'nested').read_text() == 'nested'
+
+
+def test_parallel_copytree_file_symlink(tmp_path):
+    """Tests that _parallel_copytree copies symlinks to files as symlinks, even
+    when replacing an existing file."""
+    src_dir = tmp_path / 'src'
+    src_dir.mkdir()
+    (src_dir / 'file').write_text('file')
+    os.symlink('file', src_dir / 'link')
+    dst_dir = tmp_path / 'dst'
+    dst_dir.mkdir()
+    (dst_dir / 'link').write_text('old')
+
+    oss_fuzz_benchmark_integration._parallel_copytree(str(src_dir),
+                                                      str(dst_dir))
+    assert os.path.islink(dst_dir / 'link')
+    assert os.readlink(dst_dir / 'link') == 'file'
+
+
+def test_parallel_copytree_directory_symlink(tmp_path):
+    """Tests that _parallel_copytree copies symlinks to directories as symlinks
+    without following them, even when replacing an existing directory."""
+    src_dir = tmp_path / 'src'
+    (src_dir / 'subdir').mkdir(parents=True)
+    (src_dir / 'subdir' / 'file').write_text('file')
+    os.symlink('subdir', src_dir / 'link')
+    dst_dir = tmp_path / 'dst'
+    (dst_dir / 'link').mkdir(parents=True)
+
+    oss_fuzz_benchmark_integration._parallel_copytree(str(src_dir),
+                                                      str(dst_dir))
+    assert os.path.islink(dst_dir / 'link')
+    assert os.readlink(dst_dir / 'link') == 'subdir'
+    assert (dst_dir / 'link' / 'file').read_text() == 'file'
+
+
+@mock.patch('benchmarks.oss_fuzz_benchmark_integration._load_docker_repo')
+def test_replace_base_builder_pinned(mocked_load_docker_repo, tmp_path):
+    """Tests that replace_base_builder uses the pinned digest without looking up
+    base-builder images."""
+    dockerfile_path = tmp_path / 'Dockerfile'
+    dockerfile_path.write_text(DOCKERFILE)
+    oss_fuzz_benchmark_integration.replace_base_builder(
+        str(tmp_path), datetime.datetime.now(datetime.timezone.utc))
+    assert not mocked_load_docker_repo.called
+    pinned_digest = oss_fuzz_benchmark_integration.PINNED_BASE_BUILDER_DIGEST
+    assert f'FROM {BASE_BUILDER}@{pinned_digest}\n' in (
+        dockerfile_path.read_text())
+
+
+@mock.patch('benchmarks.oss_fuzz_benchmark_integration._load_docker_repo')
+def test_replace_base_builder_dynamic(mocked_load_docker_repo, tmp_path):
+    """Tests that replace_base_builder uses the latest base-builder before the
+    commit date when |dynamic_base_builder|."""
+    mocked_load_docker_repo.return_value = (
+        oss_fuzz_benchmark_integration.BaseBuilderDockerRepo(
+            np.array(['2022-01-01T00:00:00', '2022-02-01T00:00:00'],
+                     dtype='datetime64[us]'), ('sha256:old', 'sha256:new')))
+    dockerfile_path = tmp_path / 'Dockerfile'
+    dockerfile_path.write_text(DOCKERFILE)
+    commit_date = datetime.datetime(2022, 1, 15, tzinfo=datetime.timezone.utc)
+    oss_fuzz_benchmark_integration.replace_base_builder(
+        str(tmp_path), commit_date, dynamic_base_builder=True)
+    assert f'FROM {BASE_BUILDER}@sha256:old\n' in dockerfile_path.read_text()
+
+
+def test_parse_oss_fuzz_log():
+    """Tests that _parse_oss_fuzz_log adds each commit once to every project it
+    changed."""
+    log_output = ('\x001111 100\n'
+                  '\n'
+                  'projects/zlib/Dockerfile\n'
+                  'projects/zlib/build.sh\n'
+                  '\x002222 200\n'
+                  '\n'
+                  'projects/curl/build.sh\n'
+                  'projects/zlib/project.yaml\n')
+    history = {'zlib': [[50, '0000']]}
+    oss_fuzz_benchmark_integration._parse_oss_fuzz_log(log_output, history)
+    assert history == {
+        'zlib': [[50, '0000'], [100, '1111'], [200, '2222']],
+        'curl': [[200, '2222']],
+    }
+
+
+def test_parse_oss_fuzz_log_unusual_paths():
+    """Tests that _parse_oss_fuzz_log handles quoted and non-ASCII paths and
+    ignores other output."""
+    log_output = ('warning: unrelated message\n'
+                  '\x001111 100\n'
+                  '\n'
+                  'projects/curl/s\u00e9ed.txt\n'
+                  'projects/curl/line\u2028separator\n'
+                  '"projects/zlib/tab\\tname"\n'
+                  'warning: another message\n')
+    history = {}
+    oss_fuzz_benchmark_integration._parse_oss_fuzz_log(log_output, history)
+    assert history == {
+        'curl': [[100, '1111']],
+        'zlib': [[100, '1111']],
+    }
+
+
+def _commit_oss_fuzz_change(repo_dir, timestamp, *git_args):
+    """Runs |git_args| in the git repo |repo_dir| and commits the result at
+    |timestamp|. Returns the commit."""
+    env = os.environ.copy()
+    env.update({
+        'GIT_AUTHOR_NAME': 'test',
+        'GIT_AUTHOR_EMAIL': 'test@example.com',
+        'GIT_AUTHOR_DATE': f'@{timestamp} +0000',
+        'GIT_COMMITTER_NAME': 'test',
+        'GIT_COMMITTER_EMAIL': 'test@example.com',
+        'GIT_COMMITTER_DATE': f'@{timestamp} +0000',
+    })
+    subprocess.run(['git', '-C', repo_dir] + list(git_args),
+                   env=env,
+                   check=True)
+    subprocess.run(['git', '-C', repo_dir, 'commit', '-q', '-m', 'change'],
+                   env=env,
+                   check=True)
+    return subprocess.run(['git', '-C', repo_dir, 'rev-parse', 'HEAD'],
+                          check=True,
+                          capture_output=True,
+                          text=True).stdout.strip()
+
+
+def test_get_oss_fuzz_history_incremental(tmp_path):
+    """Tests that _get_oss_fuzz_history only reads commits added since the
+    cached index was written, credits both sides of a rename and handles
+    non-ASCII paths."""
+    repo_dir = str(tmp_path / 'oss-fuzz')
+    subprocess.run(['git', 'init', '-q', repo_dir], check=True)
+    for project, filename in [('zlib', 'build.sh'), ('curl', 's\u00e9ed.txt')]:
+        os.makedirs(os.path.join(repo_dir, 'projects', project))
+        with open(os.path.join(repo_dir, 'projects', project, filename),
+                  'w',
+                  encoding='utf-8') as handle:
+            handle.write('make\n')
+    first_commit = _commit_oss_fuzz_change(repo_dir, 100, 'add', 'projects')
+
+    real_git = oss_fuzz_benchmark_integration.GitRepoManager.git
+    with mock.patch('benchmarks.oss_fuzz_benchmark_integration.'
+                    'OSS_FUZZ_CACHE_DIR', repo_dir), \
+            mock.patch('benchmarks.oss_fuzz_benchmark_integration.'
+                       'OSS_FUZZ_HISTORY_FILE',
+                       str(tmp_path / 'history.json')), \
+            mock.patch.object(oss_fuzz_benchmark_integration.GitRepoManager,
+                              'git',
+                              autospec=True,
+                              side_effect=real_git) as mocked_git:
+        oss_fuzz_benchmark_integration._get_oss_fuzz_history.cache_clear()
+        assert oss_fuzz_benchmark_integration._get_oss_fuzz_history(
+            first_commit) == {
+                'zlib': [[100, first_commit]],
+                'curl': [[100, first_commit]],
+            }
+
+        second_commit = _commit_oss_fuzz_change(repo_dir, 200, 'mv',
+                                                'projects/zlib',
+                                                'projects/zlib-ng')
+        mocked_git.reset_mock()
+        assert oss_fuzz_benchmark_integration._get_oss_fuzz_history(
+            second_commit) == {
+                'zlib': [[100, first_commit], [200, second_commit]],
+                'zlib-ng': [[200, second_commit]],
+                'curl': [[100, first_commit]],
+            }
+        oss_fuzz_benchmark_integration._get_oss_fuzz_history.cache_clear()
+
+    log_commands = _get_git_commands(mocked_git, 'log')
+    assert len(log_commands) == 1
+    assert f'{first_commit}..{second_commit}' in log_commands[0]
+
+
+def _get_git_commands(mocked_git, command):
+    """Returns the arguments of each call to |mocked_git| running |command|."""
+    return [
+        call.args[1]
+        for call in mocked_git.call_args_list
+        if command in call.args[1]
+    ]
+
+
+def test_get_cached_oss_fuzz_repo_fetch_interval(tmp_path):
+    """Tests that the OSS-Fuzz cache isn't fetched right after it is cloned,
+    only once the fetch interval has passed."""
+    remote_dir = str(tmp_path / 'remote')
+    subprocess.run(['git', 'init', '-q', remote_dir], check=True)
+    os.makedirs(os.path.join(remote_dir, 'projects', 'zlib'))
+    with open(os.path.join(remote_dir, 'projects', 'zlib', 'build.sh'),
+              'w',
+              encoding='utf-8') as handle:
+        handle.write('make\n')
+    _commit_oss_fuzz_change(remote_dir, 100, 'add', 'projects')
+
+    cache_dir = str(tmp_path / 'cache' / 'oss-fuzz')
+    fetch_time_file = os.path.join(cache_dir, 'fuzzbench-last-fetch')
+    real_git = oss_fuzz_benchmark_integration.GitRepoManager.git
+    with mock.patch('benchmarks.oss_fuzz_benchmark_integration.'
+                    'OSS_FUZZ_REPO_URL', remote_dir), \
+            mock.patch('benchmarks.oss_fuzz_benchmark_integration.'
+                       'OSS_FUZZ_CACHE_DIR', cache_dir), \
+            mock.patch('benchmarks.oss_fuzz_benchmark_integration.'
+                       'OSS_FUZZ_CACHE_FETCH_TIME_FILE', fetch_time_file), \
+            mock.patch.object(oss_fuzz_benchmark_integration.GitRepoManager,
+                              'git',
+                              autospec=True,
+                              side_effect=real_git) as mocked_git:
+        oss_fuzz_benchmark_integration._get_cached_oss_fuzz_repo()
+        oss_fuzz_benchmark_integration._get_cached_oss_fuzz_repo()
+        assert len(_get_git_commands(mocked_git, 'clone')) == 1
+        assert not _get_git_commands(mocked_git, 'fetch')
+
+        # Pretend the last fetch was a day ago.
+        fetch_time = time.time() - 24 * 60 * 60
+        os.utime(fetch_time_file, (fetch_time, fetch_time))
+        oss_fuzz_benchmark_integration._get_cached_oss_fuzz_repo()
+        oss_fuzz_benchmark_integration._get_cached_oss_fuzz_repo()
+        assert len(_get_git_commands(mocked_git, 'fetch')) == 1
+
+
+@mock.patch('benchmarks.oss_fuzz_benchmark_integration.integrate_benchmark')
+def test_integrate_benchmarks(mocked_integrate_benchmark):
+    """Tests that integrate_benchmarks integrates each benchmark spec and
+    returns the benchmark names in the order of the specs."""
+    mocked_integrate_benchmark.side_effect = (
+        lambda project, fuzz_target, *args: f'{project}_{fuzz_target}')
+    benchmark_specs = [
+        ('zlib', 'zlib_uncompress_fuzzer', None, 'abc', '2021-01-01'),
+        ('libpng', 'libpng_read_fuzzer', None, 'def', '2021-01-02', True),
+        ('curl', 'curl_fuzzer', 'curl', 'ghi', '2021-01-03'),
+    ]
+    assert oss_fuzz_benchmark_integration.integrate_benchmarks(
+        benchmark_specs) == [
+            'zlib_zlib_uncompress_fuzzer', 'libpng_libpng_read_fuzzer',
+            'curl_curl_fuzzer'
+        ]
+    assert sorted(mocked_integrate_benchmark.call_args_list) == sorted(
+        mock.call(*benchmark_spec) for benchmark_spec in benchmark_specs)
+
+
+def test_integrate_benchmarks_empty():
+    """Tests that integrate_benchmarks handles an empty list of specs."""
+    assert not oss_fuzz_benchmark_integration.integrate_benchmarks([])
@@ -150,19 +150,25 @@ def create_cloudbuild_spec(image_templates,
             'env': ['DOCKER_BUILDKIT=1'],
             'name': DOCKER_IMAGE,
         }
-        step['args'] = [
-            'build',
-            '--tag',
+        step['args'] = ['build']
+        tags = [
             _get_experiment_image_tag(image_specs),
-            '--tag',
             _get_gcb_image_tag(image_specs),
-            '--tag',
             _get_cachable_image_tag(image_specs),
-            '--cache-from',
+        ]
+        # The GCB and cachable tags are the same when the standard registry is
+        # used, so only pass each tag once.
+        for tag in dict.fromkeys(tags):
+            step['args'] += ['--tag', tag]
+        # Also cache from the experiment-specific tag so that rebuilds within
+        # an experiment can reuse layers from its earlier builds.
+        cache_from_tags = [
             _get_cachable_image_tag(image_specs),
-            '--build-arg',
-            'BUILDKIT_INLINE_CACHE=1',
+            _get_experiment_image_tag(image_specs),
         ]
+        for tag in cache_from_tags:
+            step['args'] += ['--cache-from', tag]
+        step['args'] += ['--build-arg', 'BUILDKIT_INLINE_CACHE=1']
         for build_arg in image_specs.get('build_arg', []):
             step['args'] += ['--build-arg', build_arg]
 
@@ -12,259 +12,225 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Tests for generate_cloudbuild.py."""
-import os
+import pytest
 
 from experiment.build import generate_cloudbuild
 
 # pylint: disable=unused-argument
 
-
-def test_generate_cloudbuild_spec_build_base_image(experiment):
-    """Tests generation of cloud build configuration yaml for the base image."""
-    image_templates = {
-        'base-image': {
-            'dockerfile': 'docker/base-image/Dockerfile',
-            'context': 'docker/base-image',
-            'tag': 'base-image',
-            'type': 'base'
-        }
-    }
-    generated_spec = generate_cloudbuild.create_cloudbuild_spec(
-        image_templates,
-        benchmark='no-benchmark',
-        fuzzer='no-fuzzer',
-        build_base_images=True)
-
-    expected_spec = {
-        'steps': [{
-            'id': 'base-image',
-            'env': ['DOCKER_BUILDKIT=1'],
-            'name': 'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'build', '--tag', 'gcr.dockerproxy.com/fuzzbench/base-image:test-experiment',
-                '--tag', 'gcr.dockerproxy.com/fuzzbench/base-image', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/base-image', '--cache-from',
-                'gcr.dockerproxy.com/fuzzbench/base-image', '--build-arg',
-                'BUILDKIT_INLINE_CACHE=1', '--file',
-                'docker/base-image/Dockerfile', 'docker/base-image'
-            ],
-            'wait_for': []
-        }],
-        'images': [
-            'gcr.dockerproxy.com/fuzzbench/base-image:test-experiment',
-            'gcr.dockerproxy.com/fuzzbench/base-image'
+STANDARD_REGISTRY = 'gcr.dockerproxy.com/fuzzbench'
+OTHER_REGISTRY = 'gcr.dockerproxy.com/not-fuzzbench'
+
+
+def _make_step(step_id,
+               tag,
+               dockerfile,
+               context,
+               *,
+               wait_for=(),
+               build_args=(),
+               registry=STANDARD_REGISTRY,
+               tags=None):
+    """Returns the expected build step for the image |step_id|. |tags| defaults
+    to the tags of an image in |STANDARD_REGISTRY|."""
+    # pylint: disable=too-many-arguments
+    if tags is None:
+        tags = [
+            f'{STANDARD_REGISTRY}/{tag}:test-experiment',
+            f'{STANDARD_REGISTRY}/{tag}',
         ]
+    args = ['build']
+    for image_tag in tags:
+        args += ['--tag', image_tag]
+    args += [
+        '--cache-from',
+        f'{registry}/{tag}',
+        '--cache-from',
+        f'{registry}/{tag}:test-experiment',
+        '--build-arg',
+        'BUILDKIT_INLINE_CACHE=1',
+    ]
+    for build_arg in build_args:
+        args += ['--build-arg', build_arg]
+    args += ['--file', dockerfile, context]
+    return {
+        'id': step_id,
+        'env': ['DOCKER_BUILDKIT=1'],
+        'name': 'gcr.dockerproxy.com/cloud-builders/docker',
+        'args': args,
+        'wait_for': list(wait_for),
     }
 
-    assert generated_spec == expected_spec
-
 
-def test_generate_cloudbuild_spec_other_registry(experiment):
-    """Tests generation of cloud build configuration yaml for the base image
-    when a registry other than gcr.dockerproxy.com/fuzzbench is specified.
-    """
-    os.environ['DOCKER_REGISTRY'] = 'gcr.dockerproxy.com/not-fuzzbench'
-    image_templates = {
-        'base-image': {
-            'dockerfile': 'docker/base-image/Dockerfile',
-            'context': 'docker/base-image',
-            'tag': 'base-image',
-            'type': 'base'
-        }
-    }
-    generated_spec = generate_cloudbuild.create_cloudbuild_spec(
-        image_templates,
-        benchmark='no-benchmark',
-        fuzzer='no-fuzzer',
-        build_base_images=True)
+def _make_images(tag, registry=STANDARD_REGISTRY):
+    """Returns the expected images pushed for the image tagged |tag|."""
+    return [f'{registry}/{tag}:test-experiment', f'{registry}/{tag}']
 
-    expected_spec = {
-        'steps': [{
-            'id': 'base-image',
-            'env': ['DOCKER_BUILDKIT=1'],
-            'name': 'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'build', '--tag', 'gcr.dockerproxy.com/not-fuzzbench/base-image'
-                ':test-experiment', '--tag', 'gcr.dockerproxy.com/fuzzbench/base-image',
-                '--tag', 'gcr.dockerproxy.com/not-fuzzbench/base-image', '--cache-from',
-                'gcr.dockerproxy.com/not-fuzzbench/base-image', '--build-arg',
-                'BUILDKIT_INLINE_CACHE=1', '--file',
-                'docker/base-image/Dockerfile', 'docker/base-image'
-            ],
-            'wait_for': []
-        }],
-        'images': [
-            'gcr.dockerproxy.com/not-fuzzbench/base-image:test-experiment',
-            'gcr.dockerproxy.com/not-fuzzbench/base-image'
-        ]
-    }
 
-    assert generated_spec == expected_spec
+def _make_expected(steps, images):
+    """Returns the expected cloud build spec."""
+    return {'steps': steps, 'images': images}
 
 
-def test_generate_cloudbuild_spec_build_fuzzer_benchmark(experiment):
-    """Tests generation of cloud build configuration yaml for a fuzzer-benchmark
-    build."""
-    image_templates = {
-        'afl-zlib-builder-intermediate': {
-            'build_arg': [
-                'parent_image=gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib'
-            ],
-            'depends_on': ['zlib-project-builder'],
-            'dockerfile': 'fuzzers/afl/builder.Dockerfile',
-            'context': 'fuzzers/afl',
-            'tag': 'builders/afl/zlib-intermediate',
-            'type': 'builder'
-        }
+BASE_IMAGE_TEMPLATES = {
+    'base-image': {
+        'dockerfile': 'docker/base-image/Dockerfile',
+        'context': 'docker/base-image',
+        'tag': 'base-image',
+        'type': 'base'
     }
-
-    generated_spec = generate_cloudbuild.create_cloudbuild_spec(
-        image_templates,
-        benchmark='no-benchmark',
-        fuzzer='no-fuzzer',
-    )
-
-    expected_spec = {
-        'steps': [{
-            'id': 'afl-zlib-builder-intermediate',
-            'env': ['DOCKER_BUILDKIT=1'],
-            'name': 'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'build', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/afl/zlib-intermediate'
-                ':test-experiment', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/afl/zlib-intermediate', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/afl/zlib-intermediate',
-                '--cache-from',
-                'gcr.dockerproxy.com/fuzzbench/builders/afl/zlib-intermediate',
-                '--build-arg', 'BUILDKIT_INLINE_CACHE=1', '--build-arg',
-                'parent_image=gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib',
-                '--file', 'fuzzers/afl/builder.Dockerfile', 'fuzzers/afl'
-            ],
-            'wait_for': ['zlib-project-builder']
-        }],
-        'images': [
-            'gcr.dockerproxy.com/fuzzbench/builders/afl/zlib-intermediate:test-experiment',
-            'gcr.dockerproxy.com/fuzzbench/builders/afl/zlib-intermediate'
-        ]
+}
+
+FUZZER_BENCHMARK_TEMPLATES = {
+    'afl-zlib-builder-intermediate': {
+        'build_arg': [
+            'parent_image=gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib'
+        ],
+        'depends_on': ['zlib-project-builder'],
+        'dockerfile': 'fuzzers/afl/builder.Dockerfile',
+        'context': 'fuzzers/afl',
+        'tag': 'builders/afl/zlib-intermediate',
+        'type': 'builder'
     }
-    assert generated_spec == expected_spec
-
-
-def test_generate_cloudbuild_spec_build_benchmark_coverage(experiment):
-    """Tests generation of cloud build configuration yaml for a benchmark
-    coverage build."""
-    image_templates = {
-        'zlib-project-builder': {
-            'dockerfile': 'benchmarks/zlib/Dockerfile',
-            'context': 'benchmarks/zlib',
-            'tag': 'builders/benchmark/zlib',
-            'type': 'builder'
-        },
-        'coverage-zlib-builder-intermediate': {
-            'build_arg': [
-                'parent_image=gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib'
-            ],
-            'depends_on': ['zlib-project-builder'],
-            'dockerfile': 'fuzzers/coverage/builder.Dockerfile',
-            'context': 'fuzzers/coverage',
-            'tag': 'builders/coverage/zlib-intermediate',
-            'type': 'coverage'
-        },
-        'coverage-zlib-builder': {
-            'build_arg': [
-                'benchmark=zlib', 'fuzzer=coverage',
-                'parent_image=gcr.dockerproxy.com/fuzzbench/builders/coverage/'
-                'zlib-intermediate'
-            ],
-            'depends_on': ['coverage-zlib-builder-intermediate'],
-            'dockerfile': 'docker/benchmark-builder/Dockerfile',
-            'context': '.',
-            'tag': 'builders/coverage/zlib',
-            'type': 'coverage'
-        }
+}
+
+BENCHMARK_COVERAGE_TEMPLATES = {
+    'zlib-project-builder': {
+        'dockerfile': 'benchmarks/zlib/Dockerfile',
+        'context': 'benchmarks/zlib',
+        'tag': 'builders/benchmark/zlib',
+        'type': 'builder'
+    },
+    'coverage-zlib-builder-intermediate': {
+        'build_arg': [
+            'parent_image=gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib'
+        ],
+        'depends_on': ['zlib-project-builder'],
+        'dockerfile': 'fuzzers/coverage/builder.Dockerfile',
+        'context': 'fuzzers/coverage',
+        'tag': 'builders/coverage/zlib-intermediate',
+        'type': 'coverage'
+    },
+    'coverage-zlib-builder': {
+        'build_arg': [
+            'benchmark=zlib', 'fuzzer=coverage',
+            'parent_image=gcr.dockerproxy.com/fuzzbench/builders/coverage/'
+            'zlib-intermediate'
+        ],
+        'depends_on': ['coverage-zlib-builder-intermediate'],
+        'dockerfile': 'docker/benchmark-builder/Dockerfile',
+        'context': '.',
+        'tag': 'builders/coverage/zlib',
+        'type': 'coverage'
     }
-
+}
+
+BASE_IMAGE_KWARGS = {
+    'benchmark': 'no-benchmark',
+    'fuzzer': 'no-fuzzer',
+    'build_base_images': True
+}
+
+
+@pytest.mark.parametrize(
+    ('image_templates', 'kwargs', 'docker_registry', 'expected_spec'),
+    [
+        # Base image.
+        (BASE_IMAGE_TEMPLATES, BASE_IMAGE_KWARGS, STANDARD_REGISTRY,
+         _make_expected([
+             _make_step('base-image', 'base-image',
+                        'docker/base-image/Dockerfile', 'docker/base-image')
+         ], _make_images('base-image'))),
+        # Base image when a registry other than gcr.dockerproxy.com/fuzzbench
+        # is specified.
+        (BASE_IMAGE_TEMPLATES, BASE_IMAGE_KWARGS, OTHER_REGISTRY,
+         _make_expected([
+             _make_step('base-image',
+                        'base-image',
+                        'docker/base-image/Dockerfile',
+                        'docker/base-image',
+                        registry=OTHER_REGISTRY,
+                        tags=[
+                            f'{OTHER_REGISTRY}/base-image:test-experiment',
+                            f'{STANDARD_REGISTRY}/base-image',
+                            f'{OTHER_REGISTRY}/base-image',
+                        ])
+         ], _make_images('base-image', registry=OTHER_REGISTRY))),
+        # Fuzzer-benchmark build.
+        (FUZZER_BENCHMARK_TEMPLATES, {
+            'benchmark': 'no-benchmark',
+            'fuzzer': 'no-fuzzer'
+        }, STANDARD_REGISTRY,
+         _make_expected([
+             _make_step(
+                 'afl-zlib-builder-intermediate',
+                 'builders/afl/zlib-intermediate',
+                 'fuzzers/afl/builder.Dockerfile',
+                 'fuzzers/afl',
+                 wait_for=['zlib-project-builder'],
+                 build_args=[
+                     'parent_image=gcr.dockerproxy.com/fuzzbench/builders/'
+                     'benchmark/zlib'
+                 ])
+         ], _make_images('builders/afl/zlib-intermediate'))),
+        # Benchmark coverage build.
+        (BENCHMARK_COVERAGE_TEMPLATES, {
+            'benchmark': 'zlib',
+            'fuzzer': 'no-fuzzer'
+        }, STANDARD_REGISTRY,
+         _make_expected([
+             _make_step('zlib-project-builder', 'builders/benchmark/zlib',
+                        'benchmarks/zlib/Dockerfile', 'benchmarks/zlib'),
+             _make_step(
+                 'coverage-zlib-builder-intermediate',
+                 'builders/coverage/zlib-intermediate',
+                 'fuzzers/coverage/builder.Dockerfile',
+                 'fuzzers/coverage',
+                 wait_for=['zlib-project-builder'],
+                 build_args=[
+                     'parent_image=gcr.dockerproxy.com/fuzzbench/builders/'
+                     'benchmark/zlib'
+                 ]),
+             _make_step('coverage-zlib-builder',
+                        'builders/coverage/zlib',
+                        'docker/benchmark-builder/Dockerfile',
+                        '.',
+                        wait_for=['coverage-zlib-builder-intermediate'],
+                        build_args=[
+                            'benchmark=zlib', 'fuzzer=coverage',
+                            'parent_image=gcr.dockerproxy.com/fuzzbench/'
+                            'builders/coverage/zlib-intermediate'
+                        ]),
+             {
+                 'name':
+                     'gcr.dockerproxy.com/cloud-builders/docker',
+                 'args': [
+                     'run', '-v', '/workspace/out:/host-out',
+                     'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib:'
+                     'test-experiment', '/bin/bash', '-c',
+                     'cd /out; tar -czvf /host-out/coverage-build-zlib.tar.gz '
+                     '* /src /work'
+                 ]
+             },
+             {
+                 'name':
+                     'gcr.dockerproxy.com/cloud-builders/gsutil',
+                 'args': [
+                     '-m', 'cp', '/workspace/out/coverage-build-zlib.tar.gz',
+                     'gs://experiment-data/test-experiment/coverage-binaries/'
+                 ]
+             },
+         ],
+                        _make_images('builders/benchmark/zlib') +
+                        _make_images('builders/coverage/zlib-intermediate') +
+                        _make_images('builders/coverage/zlib'))),
+    ],
+    ids=['base', 'other_registry', 'fuzzer_benchmark', 'coverage'])
+def test_create_cloudbuild_spec(experiment, monkeypatch, image_templates,
+                                kwargs, docker_registry, expected_spec):
+    """Tests generation of cloud build configuration yaml."""
+    # pylint: disable=too-many-arguments
+    monkeypatch.setenv('DOCKER_REGISTRY', docker_registry)
     generated_spec = generate_cloudbuild.create_cloudbuild_spec(
-        image_templates, benchmark='zlib', fuzzer='no-fuzzer')
-
-    expected_spec = {
-        'steps': [{
-            'id': 'zlib-project-builder',
-            'env': ['DOCKER_BUILDKIT=1'],
-            'name': 'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'build', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib:test-experiment',
-                '--tag', 'gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib', '--cache-from',
-                'gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib', '--build-arg',
-                'BUILDKIT_INLINE_CACHE=1', '--file',
-                'benchmarks/zlib/Dockerfile', 'benchmarks/zlib'
-            ],
-            'wait_for': []
-        }, {
-            'id': 'coverage-zlib-builder-intermediate',
-            'env': ['DOCKER_BUILDKIT=1'],
-            'name': 'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'build', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib-intermediate:'
-                'test-experiment', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib-intermediate', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib-intermediate',
-                '--cache-from',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib-intermediate',
-                '--build-arg', 'BUILDKIT_INLINE_CACHE=1', '--build-arg',
-                'parent_image=gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib',
-                '--file', 'fuzzers/coverage/builder.Dockerfile',
-                'fuzzers/coverage'
-            ],
-            'wait_for': ['zlib-project-builder']
-        }, {
-            'id': 'coverage-zlib-builder',
-            'env': ['DOCKER_BUILDKIT=1'],
-            'name': 'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'build', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib:test-experiment',
-                '--tag', 'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib', '--tag',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib', '--cache-from',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib', '--build-arg',
-                'BUILDKIT_INLINE_CACHE=1', '--build-arg', 'benchmark=zlib',
-                '--build-arg', 'fuzzer=coverage', '--build-arg',
-                'parent_image=gcr.dockerproxy.com/fuzzbench/builders/coverage/'
-                'zlib-intermediate', '--file',
-                'docker/benchmark-builder/Dockerfile', '.'
-            ],
-            'wait_for': ['coverage-zlib-builder-intermediate']
-        }, {
-            'name':
-                'gcr.dockerproxy.com/cloud-builders/docker',
-            'args': [
-                'run', '-v', '/workspace/out:/host-out',
-                'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib:test-experiment',
-                '/bin/bash', '-c',
-                'cd /out; tar -czvf /host-out/coverage-build-zlib.tar.gz * '
-                '/src /work'
-            ]
-        }, {
-            'name':
-                'gcr.dockerproxy.com/cloud-builders/gsutil',
-            'args': [
-                '-m', 'cp', '/workspace/out/coverage-build-zlib.tar.gz',
-                'gs://experiment-data/test-experiment/coverage-binaries/'
-            ]
-        }],
-        'images': [
-            'gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib:test-experiment',
-            'gcr.dockerproxy.com/fuzzbench/builders/benchmark/zlib',
-            'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib-intermediate'
-            ':test-experiment',
-            'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib-intermediate',
-            'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib:test-experiment',
-            'gcr.dockerproxy.com/fuzzbench/builders/coverage/zlib'
-        ]
-    }
-
+        image_templates, **kwargs)
     assert generated_spec == expected_spec